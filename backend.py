@@ -1,20 +1,33 @@
-from fastapi import FastAPI
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional
-import time
-from player_state import PlayerStateManager
-
-app = FastAPI()
-
-# Enable CORS for local development
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # Vite dev server
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+from fastapi.responses import Response
+from typing import Annotated, Any, Dict, List, Optional, Tuple, Type, TypeVar
+import math
+import msgspec
+import orjson
+import os
+import struct
+from player_state import PlayerStateManager, diff_state
+
+class ORJSONResponse(Response):
+    """JSON response serialized with orjson"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+# Enable CORS for local development; in production the reverse proxy handles it
+if os.environ.get("DEV"):
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173"],  # Vite dev server
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
 
 # Initialize player state manager
 player_manager = PlayerStateManager()
@@ -22,65 +35,189 @@ player_manager = PlayerStateManager()
 # Create default player
 player_manager.create_player("player1")
 
-class MovementInput(BaseModel):
+class MovementInput(msgspec.Struct):
     delta_x: float
     delta_z: float
     delta_time: float
 
-class MouseInput(BaseModel):
+class MouseInput(msgspec.Struct):
     delta_x: float
 
-class PlayerFlags(BaseModel):
+class PlayerFlags(msgspec.Struct):
     is_sprinting: Optional[bool] = None
     is_crouching: Optional[bool] = None
 
+# Upper bound on input samples per /input request or WebSocket frame, since a
+# batch is applied synchronously on the event loop
+MAX_INPUT_SAMPLES = 64
+
+class InputBatch(msgspec.Struct):
+    # (delta_x, delta_z, mouse_delta_x, delta_time) per sample
+    samples: Annotated[
+        List[Tuple[float, float, float, float]],
+        msgspec.Meta(max_length=MAX_INPUT_SAMPLES),
+    ]
+
+# Binary movement input: delta_x, delta_z, delta_time
+MOVE_INPUT_STRUCT = struct.Struct("<fff")
+# Binary rotation input: mouse delta_x
+ROTATE_INPUT_STRUCT = struct.Struct("<f")
+# Binary input sample: delta_x, delta_z, mouse_delta_x, delta_time
+INPUT_SAMPLE_STRUCT = struct.Struct("<ffff")
+
+T = TypeVar("T")
+
+async def decode_body(request: Request, model: Type[T]) -> T:
+    """Decode a JSON request body straight into a msgspec struct"""
+    try:
+        return msgspec.json.decode(await request.body(), type=model)
+    except msgspec.DecodeError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+def json_body_schema(model: Type[Any]) -> Dict[str, Any]:
+    """OpenAPI requestBody for a handler that reads its body with decode_body"""
+    (_,), components = msgspec.json.schema_components((model,))
+    return {"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": components[model.__name__]}},
+    }}
+
+def binary_body_schema(layout: struct.Struct, doc: str) -> Dict[str, Any]:
+    """OpenAPI requestBody for a handler that unpacks a fixed binary layout"""
+    return {"requestBody": {
+        "required": True,
+        "description": f"{layout.size} bytes: {doc}",
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+    }}
+
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "ok"}
 
-@app.get("/player/{player_id}")
-def get_player_state(player_id: str):
+@app.get("/player/{player_id}", response_model=None)
+async def get_player_state(player_id: str):
     """Get current player state"""
-    state = player_manager.get_player_data(player_id)
+    state = player_manager.get_player_json(player_id)
     if state is None:
         return {"error": "Player not found"}
-    return state
+    return Response(content=state, media_type="application/json")
 
-@app.post("/player/{player_id}/move")
-def update_player_movement(player_id: str, input: MovementInput):
+# The move and rotate hot paths take the raw request so FastAPI resolves no body
+# model; openapi_extra keeps their input documented in /docs
+@app.post("/player/{player_id}/move", response_model=None, openapi_extra=json_body_schema(MovementInput))
+async def update_player_movement(player_id: str, request: Request):
     """Update player position based on movement input"""
-    player = player_manager.update_player_position(
+    input = await decode_body(request, MovementInput)
+    state = player_manager.tick_move(
         player_id, input.delta_x, input.delta_z, input.delta_time
     )
-    if player is None:
+    if state is None:
         return {"error": "Player not found"}
-    
-    # Update animation state
-    player_manager.update_animation_state(player_id)
-    
-    return player_manager.get_player_data(player_id)
-
-@app.post("/player/{player_id}/rotate")
-def update_player_rotation(player_id: str, input: MouseInput):
+    return ORJSONResponse(state)
+
+@app.post(
+    "/player/{player_id}/move_bin",
+    response_model=None,
+    openapi_extra=binary_body_schema(MOVE_INPUT_STRUCT, "little-endian float32 delta_x, delta_z, delta_time"),
+)
+async def update_player_movement_binary(player_id: str, request: Request):
+    """Binary variant of /move using MOVE_INPUT_STRUCT in and STATE_STRUCT out"""
+    try:
+        delta_x, delta_z, delta_time = MOVE_INPUT_STRUCT.unpack(await request.body())
+    except struct.error as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    if not (math.isfinite(delta_x) and math.isfinite(delta_z) and math.isfinite(delta_time)):
+        raise HTTPException(status_code=422, detail="Input values must be finite")
+    state = player_manager.tick_move_packed(player_id, delta_x, delta_z, delta_time)
+    if state is None:
+        # A 200 JSON body would be mis-decoded as STATE_STRUCT by binary clients
+        raise HTTPException(status_code=404, detail="Player not found")
+    return Response(content=state, media_type="application/octet-stream")
+
+@app.post("/player/{player_id}/rotate", response_model=None, openapi_extra=json_body_schema(MouseInput))
+async def update_player_rotation(player_id: str, request: Request):
     """Update player rotation based on mouse input"""
-    player = player_manager.update_player_rotation(player_id, input.delta_x)
-    if player is None:
+    input = await decode_body(request, MouseInput)
+    state = player_manager.tick_rotate(player_id, input.delta_x)
+    if state is None:
         return {"error": "Player not found"}
-    
-    return player_manager.get_player_data(player_id)
+    return ORJSONResponse(state)
+
+@app.post(
+    "/player/{player_id}/rotate_bin",
+    response_model=None,
+    openapi_extra=binary_body_schema(ROTATE_INPUT_STRUCT, "little-endian float32 mouse delta_x"),
+)
+async def update_player_rotation_binary(player_id: str, request: Request):
+    """Binary variant of /rotate using ROTATE_INPUT_STRUCT in and STATE_STRUCT out"""
+    try:
+        (delta_x,) = ROTATE_INPUT_STRUCT.unpack(await request.body())
+    except struct.error as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+    if not math.isfinite(delta_x):
+        raise HTTPException(status_code=422, detail="Input values must be finite")
+    state = player_manager.tick_rotate_packed(player_id, delta_x)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Player not found")
+    return Response(content=state, media_type="application/octet-stream")
 
-@app.post("/player/{player_id}/flags")
-def update_player_flags(player_id: str, flags: PlayerFlags):
+@app.post("/player/{player_id}/flags", response_model=None, openapi_extra=json_body_schema(PlayerFlags))
+async def update_player_flags(player_id: str, request: Request):
     """Update player movement flags (sprint, crouch)"""
-    player = player_manager.set_player_flags(
+    flags = await decode_body(request, PlayerFlags)
+    state = player_manager.tick_flags(
         player_id, 
         is_sprinting=flags.is_sprinting,
         is_crouching=flags.is_crouching
     )
-    if player is None:
+    if state is None:
         return {"error": "Player not found"}
-    
-    # Update animation state
-    player_manager.update_animation_state(player_id)
-    
-    return player_manager.get_player_data(player_id) 
\ No newline at end of file
+    return ORJSONResponse(state)
+
+@app.post("/player/{player_id}/input", response_model=None, openapi_extra=json_body_schema(InputBatch))
+async def update_player_input(player_id: str, request: Request):
+    """Apply several frames of movement and mouse input in one request"""
+    batch = await decode_body(request, InputBatch)
+    state = player_manager.tick_input(player_id, batch.samples)
+    if state is None:
+        return {"error": "Player not found"}
+    return ORJSONResponse(state)
+
+@app.websocket("/ws/{player_id}")
+async def player_input_socket(websocket: WebSocket, player_id: str):
+    """Persistent input channel: INPUT_SAMPLE_STRUCT frames in, JSON state deltas out"""
+    if player_manager.get_player(player_id) is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    last_sent = None
+    tick = 0
+    while True:
+        frame = await websocket.receive()
+        if frame["type"] == "websocket.disconnect":
+            return
+        # Only binary frames are accepted; one may carry several samples back to back
+        message = frame.get("bytes")
+        if not message or len(message) % INPUT_SAMPLE_STRUCT.size:
+            await websocket.close(code=1003)
+            return
+        if len(message) > MAX_INPUT_SAMPLES * INPUT_SAMPLE_STRUCT.size:
+            await websocket.close(code=1009)
+            return
+        samples = list(INPUT_SAMPLE_STRUCT.iter_unpack(message))
+        if not all(math.isfinite(value) for sample in samples for value in sample):
+            await websocket.close(code=1003)
+            return
+        state = player_manager.tick_input(player_id, samples)
+        if state is None:
+            await websocket.close(code=1008)
+            return
+        # Only send fields that changed since the last frame on this connection
+        tick += 1
+        delta = diff_state(last_sent, state)
+        delta["tick"] = tick
+        last_sent = state
+        await websocket.send_text(orjson.dumps(delta).decode())
+
+if __name__ == "__main__":
+    uvicorn.run("backend:app", port=8000, loop="uvloop", http="httptools", workers=1)
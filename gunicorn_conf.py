@@ -0,0 +1,15 @@
+"""Gunicorn settings for serving backend:app with uvicorn workers.
+
+Player state lives in the memory of each worker process, so every request
+for a given player_id must reach the same process. Workers behind one
+gunicorn socket are picked by the kernel, not by player, so scale out by
+running one instance per core on its own port and sharding players across
+them with a consistent hash in the reverse proxy (see README).
+"""
+import os
+
+bind = f"127.0.0.1:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn_worker.UvicornWorker"
+# Keep one worker per instance unless player state moves out of process
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+preload_app = False
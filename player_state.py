@@ -1,22 +1,140 @@
-from dataclasses import dataclass
-from typing import Dict, Any
+from dataclasses import dataclass, field
+from typing import Dict, Any, Iterable, Optional, Tuple
 import math
+import struct
+import orjson
 
-@dataclass
+# Binary wire layout: position xyz (int16 cm), rotation (uint16 turn fraction),
+# speed (uint16 cm/s), flag bits, animation index. Server-side positions are
+# unbounded; the encoding saturates at about +/-327.67 m and 655.35 units/s.
+STATE_STRUCT = struct.Struct("<hhhHHBB")
+TWO_PI = 2 * math.pi
+POSITION_SCALE = 100.0
+ROTATION_SCALE = 65536 / TWO_PI
+SPEED_SCALE = 100.0
+ANIMATION_IDS = {"idle": 0, "walk": 1, "run": 2, "sprint": 3, "crouch_walk": 4}
+# PlayerState.flags bits
+FLAG_MOVING = 1
+FLAG_SPRINTING = 2
+FLAG_CROUCHING = 4
+# Animation for every (crouching, sprinting, moving, fast) combination, indexed by
+# (flags << 1) | fast == (crouching << 3) | (sprinting << 2) | (moving << 1) | fast
+ANIMATION_TABLE = tuple(
+    "crouch_walk" if crouching and moving
+    else "sprint" if sprinting and moving
+    else "run" if moving and fast
+    else "walk" if moving
+    else "idle"
+    for crouching in (False, True)
+    for sprinting in (False, True)
+    for moving in (False, True)
+    for fast in (False, True)
+)
+# Movement input below this is treated as none; players already at rest skip the tick
+SLEEP_EPSILON = 1e-4
+
+def _saturate(value: float, low: int, high: int) -> int:
+    """Round to an int clamped to [low, high]; NaN maps to 0 and infinities saturate"""
+    if value != value:
+        return 0
+    return round(max(low, min(high, value)))
+
+def _quantize_position(value: float) -> int:
+    """Quantize a coordinate to int16 centimetres, saturating at about +/-327 m"""
+    return _saturate(value * POSITION_SCALE, -32768, 32767)
+
+def _flag_property(bit: int, doc: str) -> property:
+    """Expose one PlayerState.flags bit as a bool attribute"""
+    def getter(self) -> bool:
+        return bool(self.flags & bit)
+    def setter(self, value: bool):
+        self.flags = self.flags | bit if value else self.flags & ~bit
+        self._dirty = True
+    return property(getter, setter, doc=doc)
+
+def diff_state(previous: Optional[Dict[str, Any]], current: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the entries of a state dict that changed since the previous one"""
+    if previous is None:
+        return dict(current)
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+@dataclass(slots=True)
 class PlayerState:
-    """Player state data structure"""
+    """Player state data structure
+
+    to_dict/to_json are cached until the state is marked dirty. The flag
+    properties mark it themselves; the plain fields (position, rotation,
+    animation, flags) are written only by PlayerStateManager, which marks it
+    after each update. Treat them as read-only everywhere else.
+    """
     position_x: float = 0.0
     position_y: float = 0.0
     position_z: float = 0.0
     rotation_y: float = 0.0
     current_animation: str = "idle"
-    speed: float = 0.0
-    is_moving: bool = False
-    is_sprinting: bool = False
-    is_crouching: bool = False
+    # Squared speed; the magnitude is only needed when serializing
+    _speed_sq: float = field(default=0.0, init=False)
+    flags: int = 0
+    # Serialized snapshots, rebuilt lazily after any mutation
+    _dirty: bool = field(default=True, init=False, repr=False, compare=False)
+    _cached_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+    _cached_json: Optional[bytes] = field(default=None, init=False, repr=False, compare=False)
+    # ANIMATION_TABLE key current_animation was resolved from
+    _anim_key: int = field(default=-1, init=False, repr=False, compare=False)
+
+    is_moving = _flag_property(FLAG_MOVING, "Whether the last movement input moved the player")
+    is_sprinting = _flag_property(FLAG_SPRINTING, "Whether the sprint modifier is held")
+    is_crouching = _flag_property(FLAG_CROUCHING, "Whether the crouch modifier is held")
+
+    @property
+    def speed(self) -> float:
+        """Current movement speed in units per second"""
+        return math.sqrt(self._speed_sq)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize state as dictionary for API response, reused while unchanged (treat as read-only)"""
+        if self._dirty:
+            self._cached_dict = None
+            self._cached_json = None
+            self._dirty = False
+        if self._cached_dict is None:
+            # Rounded to what gameplay needs so the encoded numbers stay short
+            self._cached_dict = {
+                "position": [round(self.position_x, 2), round(self.position_y, 2), round(self.position_z, 2)],
+                "rotation": round(self.rotation_y, 3),
+                "animation": self.current_animation,
+                "speed": round(self.speed, 2),
+                "is_moving": self.is_moving,
+                "is_sprinting": self.is_sprinting,
+                "is_crouching": self.is_crouching
+            }
+        return self._cached_dict
+
+    def to_json(self) -> bytes:
+        """Serialize state as JSON bytes, reusing the cache while unchanged"""
+        if self._dirty or self._cached_json is None:
+            self._cached_json = orjson.dumps(self.to_dict())
+        return self._cached_json
+
+    def pack(self) -> bytes:
+        """Serialize state using the compact binary STATE_STRUCT layout"""
+        return STATE_STRUCT.pack(
+            _quantize_position(self.position_x),
+            _quantize_position(self.position_y),
+            _quantize_position(self.position_z),
+            _saturate(self.rotation_y * ROTATION_SCALE, 0, 65536) & 0xFFFF,
+            _saturate(self.speed * SPEED_SCALE, 0, 65535),
+            self.flags, ANIMATION_IDS[self.current_animation]
+        )
 
 class PlayerStateManager:
-    """Manages player state and state transitions"""
+    """Manages player state and state transitions
+
+    Not thread-safe by design: the backend calls it only from async handlers
+    on a single event loop, and no method awaits, so each update runs to
+    completion before the next one starts. Do not call it from worker threads
+    (e.g. sync FastAPI endpoints or asyncio.to_thread) without adding locking.
+    """
     
     def __init__(self):
         self.players: Dict[str, PlayerState] = {}
@@ -43,59 +161,77 @@ class PlayerStateManager:
         player = self.get_player(player_id)
         if not player:
             return None
+        self._apply_movement(player, delta_x, delta_z, delta_time)
+        return player
+    
+    def _apply_movement(self, player: PlayerState, delta_x: float, delta_z: float, delta_time: float) -> bool:
+        """Apply movement input to a resolved player, returns False while the player sleeps"""
+        # Sub-epsilon input is a stop; once at rest it would rewrite identical state
+        if abs(delta_x) + abs(delta_z) < SLEEP_EPSILON:
+            if player._speed_sq == 0.0 and not player.flags & FLAG_MOVING:
+                return False
+            player._speed_sq = 0.0
+            player.flags &= ~FLAG_MOVING
+            player._dirty = True
+            return True
             
         # Calculate movement speed
         move_speed = 5.0  # units per second
-        if player.is_sprinting:
+        if player.flags & FLAG_SPRINTING:
             move_speed = 8.0
-        elif player.is_crouching:
+        elif player.flags & FLAG_CROUCHING:
             move_speed = 2.0
             
         # Apply movement
         distance = move_speed * delta_time
         player.position_x += delta_x * distance
         player.position_z += delta_z * distance
-        player.speed = math.sqrt(delta_x**2 + delta_z**2) * move_speed
-        player.is_moving = player.speed > 0.1
-        
-        return player
+        player._speed_sq = (delta_x * delta_x + delta_z * delta_z) * (move_speed * move_speed)
+        if player._speed_sq > 0.01:  # speed > 0.1
+            player.flags |= FLAG_MOVING
+        else:
+            player.flags &= ~FLAG_MOVING
+        player._dirty = True
+        return True
     
     def update_player_rotation(self, player_id: str, mouse_delta_x: float):
         """Update player rotation based on mouse input"""
         player = self.get_player(player_id)
         if not player:
             return None
-            
+        self._apply_rotation(player, mouse_delta_x)
+        return player
+    
+    def _apply_rotation(self, player: PlayerState, mouse_delta_x: float):
+        """Apply mouse input to a resolved player's rotation"""
         # Convert mouse delta to rotation (sensitivity factor)
         sensitivity = 0.002
         player.rotation_y += mouse_delta_x * sensitivity
         
         # Keep rotation in bounds
-        player.rotation_y = player.rotation_y % (2 * math.pi)
-        
-        return player
+        player.rotation_y = player.rotation_y % TWO_PI
+        player._dirty = True
     
     def update_animation_state(self, player_id: str) -> str:
         """Determine and update current animation based on player state"""
         player = self.get_player(player_id)
         if not player:
             return "idle"
-            
+        return self._update_animation_state(player)
+    
+    def _update_animation_state(self, player: PlayerState) -> str:
+        """Update current animation of a resolved player"""
         # Animation state logic
-        if player.is_crouching and player.is_moving:
-            new_animation = "crouch_walk"
-        elif player.is_sprinting and player.is_moving:
-            new_animation = "sprint"
-        elif player.is_moving and player.speed > 4.0:
-            new_animation = "run"
-        elif player.is_moving:
-            new_animation = "walk"
-        else:
-            new_animation = "idle"
+        key = (player.flags << 1) | (player._speed_sq > 16.0)  # speed > 4.0
+        if key == player._anim_key:
+            return player.current_animation
+        player._anim_key = key
+        new_animation = ANIMATION_TABLE[key]
             
         # Only update if animation changed
         if new_animation != player.current_animation:
             player.current_animation = new_animation
+            player._dirty = True
             
         return player.current_animation
     
@@ -104,26 +240,103 @@ class PlayerStateManager:
         player = self.get_player(player_id)
         if not player:
             return None
-            
+        self._apply_flags(player, is_sprinting, is_crouching)
+        return player
+    
+    def _apply_flags(self, player: PlayerState, is_sprinting: bool = None, is_crouching: bool = None):
+        """Apply movement flags to a resolved player"""
         if is_sprinting is not None:
             player.is_sprinting = is_sprinting
         if is_crouching is not None:
             player.is_crouching = is_crouching
-            
-        return player
+        player._dirty = True
     
     def get_player_data(self, player_id: str) -> Dict[str, Any]:
         """Get player state as dictionary for API response"""
         player = self.get_player(player_id)
         if not player:
             return None
-            
-        return {
-            "position": [player.position_x, player.position_y, player.position_z],
-            "rotation": player.rotation_y,
-            "animation": player.current_animation,
-            "speed": player.speed,
-            "is_moving": player.is_moving,
-            "is_sprinting": player.is_sprinting,
-            "is_crouching": player.is_crouching
-        } 
\ No newline at end of file
+        return player.to_dict()
+    
+    def get_player_json(self, player_id: str) -> Optional[bytes]:
+        """Get player state as cached JSON bytes for API response"""
+        player = self.get_player(player_id)
+        if not player:
+            return None
+        return player.to_json()
+    
+    def _tick_move(self, player_id: str, delta_x: float, delta_z: float, delta_time: float) -> Optional[PlayerState]:
+        """Apply movement and refresh animation with a single lookup"""
+        player = self.players.get(player_id)
+        if not player:
+            return None
+        if self._apply_movement(player, delta_x, delta_z, delta_time):
+            self._update_animation_state(player)
+        return player
+    
+    def tick_move(self, player_id: str, delta_x: float, delta_z: float, delta_time: float) -> Optional[Dict[str, Any]]:
+        """Apply movement, refresh animation and return the new state in one lookup"""
+        player = self._tick_move(player_id, delta_x, delta_z, delta_time)
+        if not player:
+            return None
+        return player.to_dict()
+    
+    def tick_move_packed(self, player_id: str, delta_x: float, delta_z: float, delta_time: float) -> Optional[bytes]:
+        """Same as tick_move but returns the binary STATE_STRUCT encoding"""
+        player = self._tick_move(player_id, delta_x, delta_z, delta_time)
+        if not player:
+            return None
+        return player.pack()
+    
+    def _tick_rotate(self, player_id: str, mouse_delta_x: float) -> Optional[PlayerState]:
+        """Apply rotation with a single lookup"""
+        player = self.players.get(player_id)
+        if not player:
+            return None
+        self._apply_rotation(player, mouse_delta_x)
+        return player
+    
+    def tick_rotate(self, player_id: str, mouse_delta_x: float) -> Optional[Dict[str, Any]]:
+        """Apply rotation and return the new state in one lookup"""
+        player = self._tick_rotate(player_id, mouse_delta_x)
+        if not player:
+            return None
+        return player.to_dict()
+    
+    def tick_rotate_packed(self, player_id: str, mouse_delta_x: float) -> Optional[bytes]:
+        """Same as tick_rotate but returns the binary STATE_STRUCT encoding"""
+        player = self._tick_rotate(player_id, mouse_delta_x)
+        if not player:
+            return None
+        return player.pack()
+    
+    def tick_flags(self, player_id: str, is_sprinting: bool = None, is_crouching: bool = None) -> Optional[Dict[str, Any]]:
+        """Apply movement flags, refresh animation and return the new state in one lookup"""
+        player = self.players.get(player_id)
+        if not player:
+            return None
+        self._apply_flags(player, is_sprinting, is_crouching)
+        self._update_animation_state(player)
+        return player.to_dict()
+    
+    def _tick_input(self, player_id: str, samples: Iterable[Tuple[float, float, float, float]]) -> Optional[PlayerState]:
+        """Apply a batch of input samples and refresh animation with a single lookup"""
+        player = self.players.get(player_id)
+        if not player:
+            return None
+        awake = False
+        for delta_x, delta_z, mouse_delta_x, delta_time in samples:
+            awake |= self._apply_movement(player, delta_x, delta_z, delta_time)
+            if mouse_delta_x:
+                self._apply_rotation(player, mouse_delta_x)
+        # Animation only needs to reflect the final sample
+        if awake:
+            self._update_animation_state(player)
+        return player
+    
+    def tick_input(self, player_id: str, samples: Iterable[Tuple[float, float, float, float]]) -> Optional[Dict[str, Any]]:
+        """Apply a batch of (delta_x, delta_z, mouse_delta_x, delta_time) samples in one lookup"""
+        player = self._tick_input(player_id, samples)
+        if not player:
+            return None
+        return player.to_dict()
@@ -0,0 +1,114 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from backend import (
+    INPUT_SAMPLE_STRUCT,
+    MAX_INPUT_SAMPLES,
+    MOVE_INPUT_STRUCT,
+    ROTATE_INPUT_STRUCT,
+    app,
+    player_manager,
+)
+from player_state import ROTATION_SCALE, STATE_STRUCT
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture
+def player_id():
+    player_manager.create_player("test")
+    yield "test"
+    player_manager.players.pop("test", None)
+
+
+def test_websocket_text_frame_closes_with_unsupported_data(client, player_id):
+    with client.websocket_connect(f"/ws/{player_id}") as websocket:
+        websocket.send_text("hello")
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            websocket.receive_text()
+    assert exc_info.value.code == 1003
+
+
+def test_websocket_oversized_frame_closes_with_message_too_big(client, player_id):
+    sample = INPUT_SAMPLE_STRUCT.pack(1.0, 0.0, 0.0, 0.016)
+    with client.websocket_connect(f"/ws/{player_id}") as websocket:
+        websocket.send_bytes(sample * (MAX_INPUT_SAMPLES + 1))
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            websocket.receive_text()
+    assert exc_info.value.code == 1009
+
+
+@pytest.mark.parametrize("values", [
+    (math.nan, 0.0, 0.1),
+    (0.0, math.inf, 0.1),
+    (1.0, 0.0, -math.inf),
+])
+def test_move_bin_rejects_non_finite_input(client, player_id, values):
+    response = client.post(f"/player/{player_id}/move_bin", content=MOVE_INPUT_STRUCT.pack(*values))
+    assert response.status_code == 422
+    # The rejected input must not have reached the player state
+    assert client.get(f"/player/{player_id}").json()["position"] == [0.0, 0.0, 0.0]
+
+
+def test_rotate_bin_returns_packed_state(client, player_id):
+    response = client.post(f"/player/{player_id}/rotate_bin", content=ROTATE_INPUT_STRUCT.pack(500.0))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    rotation = STATE_STRUCT.unpack(response.content)[3]
+    assert rotation == round(player_manager.get_player(player_id).rotation_y * ROTATION_SCALE)
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/player/nobody/move_bin", MOVE_INPUT_STRUCT.pack(1.0, 0.0, 0.1)),
+    ("/player/nobody/rotate_bin", ROTATE_INPUT_STRUCT.pack(1.0)),
+])
+def test_binary_endpoints_return_404_for_unknown_player(client, path, body):
+    response = client.post(path, content=body)
+    assert response.status_code == 404
+
+
+def test_input_rejects_batches_over_the_sample_cap(client, player_id):
+    samples = [[1.0, 0.0, 0.0, 0.016]] * (MAX_INPUT_SAMPLES + 1)
+    response = client.post(f"/player/{player_id}/input", json={"samples": samples})
+    assert response.status_code == 422
+    response = client.post(f"/player/{player_id}/input", json={"samples": samples[:MAX_INPUT_SAMPLES]})
+    assert response.status_code == 200
+
+
+def test_move_rejects_malformed_json(client, player_id):
+    response = client.post(f"/player/{player_id}/move", content=b"{not json")
+    assert response.status_code == 422
+
+
+@pytest.mark.parametrize("path, media_type", [
+    ("/player/{player_id}/move", "application/json"),
+    ("/player/{player_id}/rotate", "application/json"),
+    ("/player/{player_id}/flags", "application/json"),
+    ("/player/{player_id}/input", "application/json"),
+    ("/player/{player_id}/move_bin", "application/octet-stream"),
+    ("/player/{player_id}/rotate_bin", "application/octet-stream"),
+])
+def test_raw_body_handlers_document_their_request_body(path, media_type):
+    request_body = app.openapi()["paths"][path]["post"]["requestBody"]
+    assert media_type in request_body["content"]
+
+
+def test_flags_schema_describes_player_flags():
+    request_body = app.openapi()["paths"]["/player/{player_id}/flags"]["post"]["requestBody"]
+    schema = request_body["content"]["application/json"]["schema"]
+    assert set(schema["properties"]) == {"is_sprinting", "is_crouching"}
+
+
+def test_move_and_rotate_return_state(client, player_id):
+    state = client.post(f"/player/{player_id}/move", json={"delta_x": 0.0, "delta_z": 1.0, "delta_time": 0.1}).json()
+    assert state["position"] == [0.0, 0.0, 0.5]
+    assert state["animation"] == "run"
+    state = client.post(f"/player/{player_id}/rotate", json={"delta_x": 100.0}).json()
+    assert state["rotation"] == 0.2
+    assert client.post("/player/nobody/rotate", json={"delta_x": 1.0}).json() == {"error": "Player not found"}
@@ -0,0 +1,272 @@
+import itertools
+import math
+
+import orjson
+import pytest
+
+import player_state
+
+from player_state import (
+    ANIMATION_TABLE,
+    FLAG_CROUCHING,
+    FLAG_MOVING,
+    FLAG_SPRINTING,
+    SLEEP_EPSILON,
+    STATE_STRUCT,
+    PlayerState,
+    PlayerStateManager,
+    diff_state,
+)
+
+
+@pytest.fixture
+def manager():
+    manager = PlayerStateManager()
+    manager.create_player("p")
+    return manager
+
+
+def test_unknown_player_returns_none(manager):
+    assert manager.tick_move("nobody", 1.0, 0.0, 0.1) is None
+    assert manager.tick_rotate("nobody", 1.0) is None
+    assert manager.tick_flags("nobody", is_sprinting=True) is None
+    assert manager.tick_input("nobody", [(1.0, 0.0, 0.0, 0.1)]) is None
+    assert manager.tick_move_packed("nobody", 1.0, 0.0, 0.1) is None
+    assert manager.tick_rotate_packed("nobody", 1.0) is None
+    assert manager.get_player_json("nobody") is None
+
+
+def test_cached_json_reused_while_unchanged(manager):
+    player = manager.get_player("p")
+    assert player.to_json() is player.to_json()
+    assert manager.get_player_json("p") is player.to_json()
+
+
+MUTATORS = [
+    lambda m: m.tick_move("p", 1.0, 0.0, 0.1),
+    lambda m: m.tick_rotate("p", 100.0),
+    lambda m: m.tick_flags("p", is_crouching=True),
+    lambda m: m.tick_input("p", [(0.0, 1.0, 50.0, 0.1)]),
+    lambda m: m.update_player_position("p", 1.0, 0.0, 0.1),
+    lambda m: m.update_player_rotation("p", 100.0),
+    lambda m: m.set_player_flags("p", is_sprinting=True),
+    lambda m: m.tick_move_packed("p", 0.0, 1.0, 0.1),
+]
+
+
+@pytest.mark.parametrize("mutate", MUTATORS)
+def test_mutators_invalidate_cached_json(manager, mutate):
+    player = manager.get_player("p")
+    before = player.to_json()
+    mutate(manager)
+    assert player.to_json() != before
+    assert orjson.loads(player.to_json()) == orjson.loads(orjson.dumps(player.to_dict()))
+
+
+@pytest.mark.parametrize("name", ["_speed_sq", "_dirty", "_cached_dict", "_cached_json", "_anim_key"])
+def test_private_fields_are_not_constructor_arguments(name):
+    with pytest.raises(TypeError):
+        PlayerState(**{name: None})
+
+
+def test_diff_state_without_previous_copies_everything():
+    current = {"a": 1, "b": [1, 2]}
+    delta = diff_state(None, current)
+    assert delta == current
+    assert delta is not current
+
+
+def test_diff_state_returns_only_changed_keys():
+    previous = {"position": [1.0, 0.0, 2.0], "rotation": 0.5, "animation": "walk"}
+    current = {"position": [1.5, 0.0, 2.0], "rotation": 0.5, "animation": "run"}
+    assert diff_state(previous, current) == {"position": [1.5, 0.0, 2.0], "animation": "run"}
+
+
+def test_diff_state_of_unchanged_state_is_empty():
+    state = PlayerState().to_dict()
+    assert diff_state(state, state) == {}
+    assert diff_state(state, dict(state)) == {}
+
+
+def test_diff_state_includes_new_keys():
+    assert diff_state({"a": 1}, {"a": 1, "b": 2}) == {"b": 2}
+
+
+def test_to_dict_rounds_serialized_values(manager):
+    player = manager.get_player("p")
+    manager.tick_move("p", 0.123456, 0.0, 1.0)
+    manager.tick_rotate("p", 123.456)
+    state = player.to_dict()
+    assert state["position"] == [round(player.position_x, 2), 0.0, 0.0]
+    assert state["rotation"] == round(player.rotation_y, 3)
+    assert state["speed"] == round(player.speed, 2)
+
+
+def test_pack_round_trip(manager):
+    manager.players["q"] = PlayerState(position_x=12.345, position_y=-0.5, position_z=-250.0, rotation_y=math.pi)
+    manager.tick_flags("q", is_sprinting=True)
+    packed = manager.tick_move_packed("q", 1.0, 0.0, 0.0)
+    assert len(packed) == STATE_STRUCT.size
+    x, y, z, rotation, speed, flags, animation = STATE_STRUCT.unpack(packed)
+    assert (x, y, z) == (1234, -50, -25000)
+    assert rotation == 32768
+    assert speed == 800
+    assert flags == FLAG_MOVING | FLAG_SPRINTING
+    assert animation == 3
+
+
+def test_pack_saturates_out_of_range_values(manager):
+    manager.players["q"] = PlayerState(position_x=1000.0, position_y=-1000.0, position_z=327.675)
+    packed = manager.tick_move_packed("q", 1e6, 0.0, 0.0)
+    x, y, z, _, speed, _, _ = STATE_STRUCT.unpack(packed)
+    assert (x, y, z) == (32767, -32768, 32767)
+    assert speed == 65535
+
+
+def test_pack_wraps_rotation_just_below_full_turn():
+    player = PlayerState(rotation_y=math.nextafter(2 * math.pi, 0.0))
+    assert STATE_STRUCT.unpack(player.pack())[3] == 0
+
+
+@pytest.mark.parametrize("delta, expected_speed", [(math.inf, 65535), (math.nan, 0)])
+def test_pack_handles_non_finite_values(manager, delta, expected_speed):
+    manager.players["q"] = PlayerState(position_x=math.nan, position_y=math.inf, position_z=-math.inf, rotation_y=math.nan)
+    packed = manager.tick_move_packed("q", delta, 0.0, 0.1)
+    x, y, z, rotation, speed, _, _ = STATE_STRUCT.unpack(packed)
+    assert (x, y, z) == (0, 32767, -32768)
+    assert rotation == 0
+    assert speed == expected_speed
+
+
+def test_resting_player_skips_idle_ticks(manager):
+    player = manager.get_player("p")
+    manager.tick_move("p", 1.0, 0.0, 0.1)
+    manager.tick_move("p", 0.0, 0.0, 0.1)
+    cached_dict = player.to_dict()
+    cached_json = player.to_json()
+
+    assert manager._apply_movement(player, 0.0, 0.0, 0.1) is False
+    assert manager.tick_move("p", 0.0, 0.0, 0.1) is cached_dict
+    assert player.to_json() is cached_json
+
+
+def test_resting_player_wakes_on_input(manager):
+    player = manager.get_player("p")
+    manager.tick_move("p", 0.0, 0.0, 0.1)
+    cached_dict = player.to_dict()
+
+    state = manager.tick_move("p", 0.0, 1.0, 0.1)
+
+    assert state is not cached_dict
+    assert state["is_moving"] is True
+    assert state["animation"] == "run"
+    assert player.position_z == pytest.approx(0.5)
+
+
+def test_batch_with_only_idle_samples_keeps_cache(manager):
+    player = manager.get_player("p")
+    cached_dict = player.to_dict()
+    assert manager.tick_input("p", [(0.0, 0.0, 0.0, 0.1)] * 3) is cached_dict
+
+
+def test_cached_dict_reused_while_unchanged(manager):
+    player = manager.get_player("p")
+    assert player.to_dict() is player.to_dict()
+    assert manager.tick_move("p", 0.0, 0.0, 0.1) is player.to_dict()
+
+
+@pytest.mark.parametrize("mutate", MUTATORS)
+def test_mutators_invalidate_cached_dict(manager, mutate):
+    player = manager.get_player("p")
+    before = player.to_dict()
+    mutate(manager)
+    after = player.to_dict()
+    assert after is not before
+    assert after != before
+
+
+def test_update_animation_state_invalidates_cached_dict(manager):
+    player = manager.get_player("p")
+    manager.update_player_position("p", 1.0, 0.0, 0.1)
+    before = player.to_dict()
+    manager.update_animation_state("p")
+    assert player.to_dict() is not before
+    assert player.to_dict()["animation"] == "run"
+
+
+def ladder_animation(player):
+    """The if/elif animation ladder ANIMATION_TABLE replaced"""
+    if player.is_crouching and player.is_moving:
+        return "crouch_walk"
+    if player.is_sprinting and player.is_moving:
+        return "sprint"
+    if player.is_moving and player.speed > 4.0:
+        return "run"
+    if player.is_moving:
+        return "walk"
+    return "idle"
+
+
+# Every FLAG_* bit, so a new flag that the table does not index fails here
+FLAG_BITS = [value for name, value in vars(player_state).items() if name.startswith("FLAG_")]
+
+
+@pytest.mark.parametrize("bits", list(itertools.product((False, True), repeat=len(FLAG_BITS))))
+@pytest.mark.parametrize("speed", [3.0, 4.0, 5.0])
+def test_animation_table_matches_ladder(manager, bits, speed):
+    player = manager.get_player("p")
+    player.flags = sum(bit for bit, on in zip(FLAG_BITS, bits) if on)
+    player._speed_sq = speed * speed
+    assert manager.update_animation_state("p") == ladder_animation(player)
+
+
+def test_animation_table_covers_every_flag_combination():
+    assert len(ANIMATION_TABLE) == 2 << len(FLAG_BITS)
+
+
+@pytest.mark.parametrize("name, bit", [
+    ("is_moving", FLAG_MOVING),
+    ("is_sprinting", FLAG_SPRINTING),
+    ("is_crouching", FLAG_CROUCHING),
+])
+def test_flag_setters_update_bits_and_invalidate_cache(name, bit):
+    player = PlayerState()
+    before_dict = player.to_dict()
+    before_json = player.to_json()
+
+    setattr(player, name, True)
+
+    assert player.flags == bit
+    assert player.to_dict()[name] is True
+    assert player.to_json() != before_json
+    assert player.to_dict() is not before_dict
+    assert STATE_STRUCT.unpack(player.pack())[5] == bit
+
+    setattr(player, name, False)
+
+    assert player.flags == 0
+    assert player.to_dict()[name] is False
+
+
+def test_sub_epsilon_input_stops_moving_player(manager):
+    player = manager.get_player("p")
+    manager.tick_move("p", 1.0, 0.0, 0.1)
+    position = player.position_x
+
+    state = manager.tick_move("p", SLEEP_EPSILON / 2, 0.0, 0.1)
+
+    assert player.position_x == position
+    assert not player.flags & FLAG_MOVING
+    assert state["speed"] == 0.0
+    assert state["animation"] == "idle"
+
+
+@pytest.mark.parametrize("delta", [SLEEP_EPSILON / 2, -SLEEP_EPSILON / 2])
+def test_resting_player_skips_sub_epsilon_ticks(manager, delta):
+    player = manager.get_player("p")
+    manager.tick_move("p", 1.0, 0.0, 0.1)
+    manager.tick_move("p", delta, 0.0, 0.1)
+    cached_dict = player.to_dict()
+
+    assert manager._apply_movement(player, delta, 0.0, 0.1) is False
+    assert manager.tick_move("p", delta, 0.0, 0.1) is cached_dict